@@ -1,82 +1,274 @@
 import pandas as pd
 import numpy as np
-from scipy.stats import linregress
+from functools import lru_cache
+from numpy.lib.stride_tricks import sliding_window_view
+
+from pipeline_io import preferred_path
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+VITAL_COLUMNS = ['heart_rate', 'spo2', 'bp_systolic']
+
+# Rule reasons, packed as bits (1 << i) in the per-window reason mask
+REASON_LABELS = ["Rising HR trend", "Declining SpO2 trend", "Rising Systolic BP"]
+REASON_STRINGS = np.array([
+    "; ".join(label for i, label in enumerate(REASON_LABELS) if code & (1 << i))
+    for code in range(1 << len(REASON_LABELS))
+])
+
+@lru_cache(maxsize=8)
+def _slope_basis(n):
+    """
+    Centered time basis t - t_mean for t = 0..n-1 and its sum of squares, n(n^2-1)/12.
+    Shared by every window of the same size; the array is read-only since it is cached.
+    """
+    t = np.arange(n) - (n - 1) / 2
+    t.flags.writeable = False
+    return t, float((t * t).sum())
+
+def _nanmean(v):
+    # NaN-skipping mean like pandas .mean(), without the empty-slice warning of np.nanmean
+    valid = ~np.isnan(v)
+    return v[valid].sum() / valid.sum() if valid.any() else np.nan
 
 def extract_features(window):
     """
     Extracts mean, slope, and variance from a temporal window of vitals.
+    `window` is a DataFrame or a mapping of column name to array.
     """
     features = {}
-    for col in ['heart_rate', 'spo2', 'bp_systolic']:
-        v = window[col].values
-        t = np.arange(len(v))
+    for col in VITAL_COLUMNS:
+        v = np.asarray(window[col], dtype=np.float64)
+        n = len(v)
         
         features[f'{col}_mean'] = np.mean(v)
         features[f'{col}_var'] = np.var(v)
         
-        # Slope using linear regression
-        if len(v) > 1 and not np.any(np.isnan(v)):
-            slope, _, _, _, _ = linregress(t, v)
-            features[f'{col}_slope'] = slope
+        # Least-squares slope against t = 0..n-1 (closed form)
+        if n > 1 and np.isfinite(v).all():
+            t_centered, t_var = _slope_basis(n)
+            features[f'{col}_slope'] = ((v - v.mean()) * t_centered).sum() / t_var
         else:
             features[f'{col}_slope'] = 0.0
             
     # Artifact confidence mean in this window
-    features['confidence_mean'] = window['artifact_confidence'].mean()
+    features['confidence_mean'] = _nanmean(np.asarray(window['artifact_confidence'], dtype=np.float64))
     
     return features
 
-def detect_anomalies(df, window_size=30, step_size=10):
+def _window_features_numpy(df, window_size, step_size, n_windows):
     """
-    Sliding window anomaly detection.
+    Vectorized equivalent of extract_features over every sliding window.
     """
-    anomalies = []
+    # Centered time basis is identical for every window, so the least-squares
+    # slope reduces to sum((t - t_mean) * v) / sum((t - t_mean)^2)
+    t_centered, t_var = _slope_basis(window_size)
     
-    for start in range(0, len(df) - window_size, step_size):
-        end = start + window_size
-        window = df.iloc[start:end]
+    features = {}
+    for col in VITAL_COLUMNS:
+        arr = df[col].to_numpy(dtype=np.float32)
+        W = sliding_window_view(arr, window_size)[::step_size][:n_windows]
+        
+        # float32 samples, float64 accumulation
+        means = W.mean(axis=1, dtype=np.float64)
+        features[f'{col}_mean'] = means
+        features[f'{col}_var'] = W.var(axis=1, dtype=np.float64)
+        
+        # Windows with missing samples get a flat slope (matches extract_features)
+        slopes = ((W - means[:, None]) * t_centered).sum(axis=1) / t_var if window_size > 1 else np.zeros(n_windows)
+        features[f'{col}_slope'] = np.where(np.isnan(means), 0.0, slopes)
+    
+    # Artifact confidence mean, skipping NaNs like pandas .mean()
+    conf = df['artifact_confidence'].to_numpy(dtype=np.float64)
+    C = sliding_window_view(conf, window_size)[::step_size][:n_windows]
+    valid = ~np.isnan(C)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        features['confidence_mean'] = np.where(valid, C, 0.0).sum(axis=1) / valid.sum(axis=1)
+    
+    return features
+
+def _reason_bits(feats):
+    """
+    Evaluates the detection rules on per-window features, returning a uint8 reason mask per window.
+    """
+    # 1. Tachycardia Trend: Increasing HR slope + High mean HR
+    rising_hr = (feats['heart_rate_slope'] > 0.05) & (feats['heart_rate_mean'] > 100)
+    
+    # 2. Desaturation Trend: Decreasing SpO2 slope
+    declining_spo2 = (feats['spo2_slope'] < -0.01) & (feats['spo2_mean'] < 95)
+    
+    # 3. Hypertension Trend: Rising BP
+    rising_bp = (feats['bp_systolic_slope'] > 0.1) & (feats['bp_systolic_mean'] > 140)
+    
+    return np.asarray(rising_hr * 1 + declining_spo2 * 2 + rising_bp * 4, dtype=np.uint8)
+
+def extract_features_and_flags(window):
+    """
+    Single-window features plus the rule evaluation used by detect_anomalies.
+    Returns (features, reasons, is_anomaly).
+    """
+    feats = extract_features(window)
+    bits = int(_reason_bits(feats))
+    reasons = [label for i, label in enumerate(REASON_LABELS) if bits & (1 << i)]
+    return feats, reasons, bits != 0
+
+if HAS_NUMBA:
+    @njit(cache=True)
+    def _window_stats(v, start, window_size, t_centered, t_var):
+        # Mean / variance / slope of one window; NaNs propagate to mean and var, slope falls back to 0
+        total = 0.0
+        for i in range(window_size):
+            total += v[start + i]
+        mean = total / window_size
         
-        feats = extract_features(window)
-        timestamp = window['timestamp'].iloc[-1]
+        sq = 0.0
+        s_tv = 0.0
+        for i in range(window_size):
+            d = v[start + i] - mean
+            sq += d * d
+            s_tv += t_centered[i] * d
         
-        # DETECTION LOGIC (Rule-based)
-        is_anomaly = False
-        reasons = []
+        slope = 0.0
+        if window_size > 1 and not np.isnan(mean):
+            slope = s_tv / t_var
+        return mean, sq / window_size, slope
+    
+    # fastmath is left off on purpose: NaN windows (sensor dropouts) must keep NaN semantics
+    @njit(parallel=True, cache=True)
+    def _run(hr, spo2, bp, conf, window_size, step_size, n_windows, t_centered, t_var):
+        stats = np.empty((n_windows, 9))
+        confidence_mean = np.empty(n_windows)
         
-        # 1. Tachycardia Trend: Increasing HR slope + High mean HR
-        if feats['heart_rate_slope'] > 0.05 and feats['heart_rate_mean'] > 100:
-            is_anomaly = True
-            reasons.append("Rising HR trend")
+        for w in prange(n_windows):
+            start = w * step_size
+            hr_mean, hr_var, hr_slope = _window_stats(hr, start, window_size, t_centered, t_var)
+            spo2_mean, spo2_var, spo2_slope = _window_stats(spo2, start, window_size, t_centered, t_var)
+            bp_mean, bp_var, bp_slope = _window_stats(bp, start, window_size, t_centered, t_var)
             
-        # 2. Desaturation Trend: Decreasing SpO2 slope
-        if feats['spo2_slope'] < -0.01 and feats['spo2_mean'] < 95:
-            is_anomaly = True
-            reasons.append("Declining SpO2 trend")
+            stats[w, 0] = hr_mean
+            stats[w, 1] = hr_var
+            stats[w, 2] = hr_slope
+            stats[w, 3] = spo2_mean
+            stats[w, 4] = spo2_var
+            stats[w, 5] = spo2_slope
+            stats[w, 6] = bp_mean
+            stats[w, 7] = bp_var
+            stats[w, 8] = bp_slope
             
-        # 3. Hypertension Trend: Rising BP
-        if feats['bp_systolic_slope'] > 0.1 and feats['bp_systolic_mean'] > 140:
-            is_anomaly = True
-            reasons.append("Rising Systolic BP")
-
-        # Suppression Logic: If confidence is low, we flag but mark as 'low confidence anomaly'
-        confidence = feats['confidence_mean']
-        
-        # Risk persistence (simplified here as per-window logic, 
-        # but in risk_logic.py we will aggregate)
+            # Artifact confidence mean, skipping NaNs like pandas .mean()
+            c_sum = 0.0
+            c_count = 0
+            for i in range(window_size):
+                c = conf[start + i]
+                if not np.isnan(c):
+                    c_sum += c
+                    c_count += 1
+            confidence_mean[w] = c_sum / c_count if c_count > 0 else np.nan
         
-        anomalies.append({
-            'timestamp': timestamp,
-            'is_anomaly': is_anomaly,
-            'confidence': confidence,
-            'reasons': "; ".join(reasons),
-            **feats
-        })
+        return stats, confidence_mean
+
+def extract_window_features(df, window_size, step_size):
+    """
+    Computes features and rule reason bits for every sliding window.
+    Returns (end_indices, features, reason_bits) with one entry per window.
+    """
+    n_windows = len(range(0, len(df) - window_size, step_size))
+    ends = np.arange(n_windows) * step_size + window_size - 1
+    
+    if HAS_NUMBA:
+        t_centered, t_var = _slope_basis(window_size)
+        stats, confidence_mean = _run(
+            np.ascontiguousarray(df['heart_rate'].to_numpy(dtype=np.float32)),
+            np.ascontiguousarray(df['spo2'].to_numpy(dtype=np.float32)),
+            np.ascontiguousarray(df['bp_systolic'].to_numpy(dtype=np.float32)),
+            np.ascontiguousarray(df['artifact_confidence'].to_numpy(dtype=np.float64)),
+            window_size, step_size, n_windows, t_centered, t_var,
+        )
+        features = {}
+        for i, col in enumerate(VITAL_COLUMNS):
+            features[f'{col}_mean'] = stats[:, 3 * i]
+            features[f'{col}_var'] = stats[:, 3 * i + 1]
+            features[f'{col}_slope'] = stats[:, 3 * i + 2]
+        features['confidence_mean'] = confidence_mean
+    else:
+        features = _window_features_numpy(df, window_size, step_size, n_windows)
+    
+    # Rules live only in _reason_bits so both paths share the same thresholds
+    return ends, features, _reason_bits(features)
+
+def detect_anomalies(df, window_size=30, step_size=10):
+    """
+    Sliding window anomaly detection.
+    """
+    if len(df) - window_size <= 0:
+        return pd.DataFrame()
+    
+    # DETECTION LOGIC (Rule-based), evaluated per window into a reason bitmask
+    ends, feats, reason_bits = extract_window_features(df, window_size, step_size)
+    
+    # Suppression Logic: If confidence is low, we flag but mark as 'low confidence anomaly'
+    # Risk persistence (simplified here as per-window logic, 
+    # but in risk_logic.py we will aggregate)
+    
+    return pd.DataFrame({
+        'timestamp': df['timestamp'].to_numpy()[ends],
+        'is_anomaly': reason_bits != 0,
+        'confidence': feats['confidence_mean'],
+        'reasons': REASON_STRINGS[reason_bits],
+        **feats
+    })
+
+def _read_chunks(path, chunksize):
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+def iter_anomalies_chunked(path, window_size=30, step_size=10, chunksize=100_000):
+    """
+    Streams a cleaned vitals CSV or Parquet file and yields detect_anomalies results chunk by chunk,
+    using constant memory. The unprocessed tail of each chunk is carried over (and rows
+    between windows are skipped when step_size > window_size) so the windows line up
+    exactly with a single detect_anomalies call on the whole file.
+    """
+    overhang = None
+    skip = 0
+    for chunk in _read_chunks(path, chunksize):
+        # Rows that fall between the last emitted window and the next window start
+        if skip:
+            dropped = min(skip, len(chunk))
+            chunk = chunk.iloc[dropped:]
+            skip -= dropped
+            if chunk.empty:
+                continue
+        buffer = chunk if overhang is None else pd.concat([overhang, chunk], ignore_index=True)
         
-    return pd.DataFrame(anomalies)
+        # detect_anomalies only emits windows followed by at least one more sample, so
+        # every emitted window is final; the next one starts at n_windows * step_size
+        n_windows = len(range(0, len(buffer) - window_size, step_size))
+        if n_windows:
+            yield detect_anomalies(buffer, window_size, step_size)
+        next_start = n_windows * step_size
+        skip = max(0, next_start - len(buffer))
+        overhang = buffer.iloc[next_start:].reset_index(drop=True)
 
 if __name__ == "__main__":
-    df = pd.read_csv("cleaned_vitals.csv")
-    anomaly_results = detect_anomalies(df)
-    anomaly_results.to_csv("anomaly_results.csv", index=False)
+    output_file = "anomaly_results.csv"
+    first = True
+    flagged = []
+    # Uses the Parquet copy written by artifact_detection.py unless the CSV is newer
+    input_file = preferred_path("cleaned_vitals.csv")
+    for anomaly_results in iter_anomalies_chunked(input_file):
+        anomaly_results.to_csv(output_file, index=False, mode='w' if first else 'a', header=first)
+        first = False
+        flagged.append(anomaly_results[anomaly_results['is_anomaly'] == True].head())
+    if first:
+        pd.DataFrame().to_csv(output_file, index=False)
     print("Anomaly detection complete. Results saved to anomaly_results.csv")
-    print(anomaly_results[anomaly_results['is_anomaly'] == True].head())
+    print(pd.concat(flagged).head() if flagged else pd.DataFrame())
@@ -1,18 +1,20 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, TypeAdapter, ValidationError
 from typing import List
 import pandas as pd
 import numpy as np
 
 import sys
 import os
+import email.message
 
 # Add the parent directory to sys.path to allow imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from anomaly_model import extract_features
+from anomaly_model import extract_features_and_flags
 from risk_logic import calculate_risk_and_alerts
-from artifact_detection import detect_and_clean_artifacts
+from artifact_detection import clean_vital_arrays, SIGNAL_DTYPE
 
 app = FastAPI(title="Smart Ambulance Anomaly Detection API")
 
@@ -24,12 +26,71 @@ class VitalsData(BaseModel):
     bp_diastolic: float
     vibration: float
 
+# Built once at import: parses and validates the raw JSON body in pydantic-core
+# instead of decoding to Python objects and validating each record separately
+vitals_list_adapter = TypeAdapter(List[VitalsData])
+
+def is_json_content_type(content_type):
+    """
+    Same media-type rule FastAPI applies before decoding a body: application/json or application/*+json.
+    """
+    if not content_type:
+        return False
+    message = email.message.Message()
+    message["content-type"] = content_type
+    subtype = message.get_content_subtype()
+    return message.get_content_maintype() == "application" and (subtype == "json" or subtype.endswith("+json"))
+
 class PredictionResponse(BaseModel):
     anomaly: bool
     risk_score: float
     confidence: float
     details: str
 
+# Schemas of FastAPI's standard 422 response body, as served by routes that declare a body model
+VALIDATION_ERROR_SCHEMA = {
+    "title": "ValidationError",
+    "type": "object",
+    "properties": {
+        "loc": {
+            "title": "Location",
+            "type": "array",
+            "items": {"anyOf": [{"type": "string"}, {"type": "integer"}]},
+        },
+        "msg": {"title": "Message", "type": "string"},
+        "type": {"title": "Error Type", "type": "string"},
+        "input": {"title": "Input"},
+        "ctx": {"title": "Context", "type": "object"},
+    },
+    "required": ["loc", "msg", "type"],
+}
+HTTP_VALIDATION_ERROR_SCHEMA = {
+    "title": "HTTPValidationError",
+    "type": "object",
+    "properties": {
+        "detail": {
+            "title": "Detail",
+            "type": "array",
+            "items": {"$ref": "#/components/schemas/ValidationError"},
+        }
+    },
+}
+
+def custom_openapi():
+    """
+    /predict reads its body from the raw request, so FastAPI does not register the
+    VitalsData schema or the validation error schemas on its own; add them here.
+    """
+    if app.openapi_schema is None:
+        schema = FastAPI.openapi(app)
+        components = schema.setdefault("components", {}).setdefault("schemas", {})
+        components["VitalsData"] = VitalsData.model_json_schema(ref_template="#/components/schemas/{model}")
+        components.setdefault("ValidationError", VALIDATION_ERROR_SCHEMA)
+        components.setdefault("HTTPValidationError", HTTP_VALIDATION_ERROR_SCHEMA)
+    return app.openapi_schema
+
+app.openapi = custom_openapi
+
 import traceback
 
 @app.get("/")
@@ -38,45 +99,71 @@ def health_check():
 
 from fastapi import Request
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict_risk(data: List[VitalsData]):
+@app.post(
+    "/predict",
+    response_model=PredictionResponse,
+    responses={422: {
+        "description": "Validation Error",
+        "content": {"application/json": {"schema": {"$ref": "#/components/schemas/HTTPValidationError"}}},
+    }},
+    openapi_extra={"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {
+            "type": "array", "items": {"$ref": "#/components/schemas/VitalsData"},
+        }}},
+    }},
+)
+async def predict_risk(request: Request):
     """
     Expects a window of vitals data (typically 30-60 seconds at 1Hz).
     """
+    body = await request.body()
+    try:
+        if is_json_content_type(request.headers.get("content-type")):
+            data = vitals_list_adapter.validate_json(body)
+        else:
+            # Other media types are not decoded, so the raw bytes fail validation (422)
+            data = vitals_list_adapter.validate_python(body)
+    except ValidationError as e:
+        raise RequestValidationError([{**err, 'loc': ('body', *err['loc'])} for err in e.errors(include_url=False)])
+    
     try:
         if len(data) < 10:
             raise HTTPException(status_code=400, detail="Insufficient data points for stable window analysis.")
         
-        # Convert input to DataFrame
-        df = pd.DataFrame([d.dict() for d in data])
+        # Extract columns straight from the validated models (no per-record dicts or input DataFrame)
+        n = len(data)
+        heart_rate = np.empty(n, dtype=SIGNAL_DTYPE)
+        spo2 = np.empty(n, dtype=SIGNAL_DTYPE)
+        bp_systolic = np.empty(n, dtype=SIGNAL_DTYPE)
+        vibration = np.empty(n, dtype=SIGNAL_DTYPE)
+        for i, d in enumerate(data):
+            heart_rate[i] = d.heart_rate
+            spo2[i] = d.spo2
+            bp_systolic[i] = d.bp_systolic
+            vibration[i] = d.vibration
         
         # 1. Artifact Detection & Cleaning
-        df_clean = detect_and_clean_artifacts(df)
+        heart_rate, spo2, artifact_confidence = clean_vital_arrays(heart_rate, spo2, vibration)
         
-        # 2. Feature Extraction (latest window)
-        feats = extract_features(df_clean)
+        # 2. Feature Extraction + rule-based anomaly check (latest window)
+        feats, reasons, is_anomaly = extract_features_and_flags({
+            'heart_rate': heart_rate,
+            'spo2': spo2,
+            'bp_systolic': bp_systolic,
+            'artifact_confidence': artifact_confidence,
+        })
         
         # 3. Anomaly & Risk Logic
         # We create a mini-batch with the window results to reuse calculate_risk_and_alerts
         temp_df = pd.DataFrame([{
-            'timestamp': df['timestamp'].iloc[-1],
-            'is_anomaly': False, # Placeholder
+            'timestamp': data[-1].timestamp,
+            'is_anomaly': is_anomaly,
             'confidence': feats['confidence_mean'],
-            'reasons': "", # Placeholder
+            'reasons': "; ".join(reasons),
             **feats
         }])
         
-        # Re-run rule-based anomaly check for the reasons string
-        reasons = []
-        if feats['heart_rate_slope'] > 0.05 and feats['heart_rate_mean'] > 100:
-            reasons.append("Rising HR trend")
-        if feats['spo2_slope'] < -0.01 and feats['spo2_mean'] < 95:
-            reasons.append("Declining SpO2 trend")
-        if feats['bp_systolic_slope'] > 0.1 and feats['bp_systolic_mean'] > 140:
-            reasons.append("Rising Systolic BP")
-        
-        temp_df['reasons'] = "; ".join(reasons)
-        
         # Risk calculation
         risk_df = calculate_risk_and_alerts(temp_df)
         result = risk_df.iloc[0]
@@ -1,89 +1,245 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.use('Agg')
+import matplotlib.pyplot as plt
 import os
 
-def detect_and_clean_artifacts(df, motion_threshold=0.6):
+from pipeline_io import read_table, plots_enabled, thin_for_plot
+
+# Physiological signals are stored as float32: sub-bpm / sub-percent resolution is plenty
+# and it halves the memory traffic of the windowed scans. Timestamps stay float64.
+SIGNAL_COLUMNS = ['heart_rate', 'spo2', 'bp_systolic', 'bp_diastolic', 'vibration']
+SIGNAL_DTYPE = np.float32
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+try:
+    import bottleneck as bn
+    HAS_BOTTLENECK = True
+except ImportError:
+    HAS_BOTTLENECK = False
+
+def _centered(trailing, window):
     """
-    Cleans physiological signals by detecting motion-induced artifacts.
-    
-    Logic:
-    1. Identify 'artifact windows' where vibration exceeds threshold.
-    2. Within these windows, if SpO2 drops or HR spikes abruptly, flag them as artifacts.
-    3. Interpolate flagged artifacts and existing NaNs.
-    4. Calculate artifact confidence score (1 - ratio of artifact windows).
+    Re-aligns a right-aligned moving-window result to pandas' center=True labels.
+    """
+    offset = (window - 1) // 2
+    out = np.full(len(trailing), np.nan)
+    out[:len(trailing) - offset] = trailing[offset:]
+    return out
+
+def _rolling_max_centered(values, window):
+    if len(values) < window:
+        return np.full(len(values), np.nan)
+    if HAS_BOTTLENECK:
+        return _centered(bn.move_max(values, window=window, min_count=window), window)
+    return pd.Series(values).rolling(window, center=True).max().to_numpy()
+
+def _rolling_mean_centered(values, window):
+    if len(values) < window:
+        return np.full(len(values), np.nan)
+    if HAS_BOTTLENECK:
+        return _centered(bn.move_mean(values, window=window, min_count=window), window)
+    return pd.Series(values).rolling(window, center=True).mean().to_numpy()
+
+def _clean_numpy(vibration, spo2, hr, motion_threshold):
+    """
+    Reference implementation of the artifact flagging steps using vectorized moving windows.
+    Returns (is_motion, motion_risk, hr_artifact, spo2_artifact, hr_out, spo2_out, confidence).
     """
-    df_clean = df.copy()
-    
     # 1. Identify windows with high vibration
-    df_clean['is_motion'] = df_clean['vibration'] > motion_threshold
+    is_motion = vibration > motion_threshold
     
     # Calculate rolling motion to smooth artifact windows
-    df_clean['motion_risk'] = df_clean['is_motion'].rolling(window=5, center=True).max().fillna(0)
+    motion_risk = np.nan_to_num(_rolling_max_centered(is_motion.astype(np.float64), 5), nan=0.0)
+    moving = motion_risk > 0.5
     
     # 2. Flag artifacts coupled with motion
     # logic: if motion_risk is high, we are skeptical of sudden vital changes
+    # (diffs are NaN for the first sample and around dropouts, so they never flag)
     
-    # Initialize artifact flags
-    df_clean['hr_artifact'] = False
-    df_clean['spo2_artifact'] = False
-    
-    # SpO2 artifact: sudden drop (>2% in 1s) coupled with motion
-    spo2_diff = df_clean['spo2'].diff().abs()
-    df_clean.loc[(df_clean['motion_risk'] > 0.5) & (spo2_diff > 2.0), 'spo2_artifact'] = True
+    # SpO2 artifact: sudden drop (>2% in 1s) coupled with motion,
+    # or extremely unrealistic values during motion
+    spo2_artifact = (moving & (np.abs(np.diff(spo2, prepend=np.nan)) > 2.0)) | ((motion_risk > 0.8) & (spo2 < 85))
     
     # HR artifact: sudden spike (>5 bpm in 1s) coupled with motion
-    hr_diff = df_clean['heart_rate'].diff().abs()
-    df_clean.loc[(df_clean['motion_risk'] > 0.5) & (hr_diff > 5.0), 'hr_artifact'] = True
-
-    # Also handle extremely unrealistic values during motion
-    df_clean.loc[(df_clean['motion_risk'] > 0.8) & (df_clean['spo2'] < 85), 'spo2_artifact'] = True
-    
-    # 3. Suppress artifacts and Interpolate
-    # Replace flagged artifacts with NaN
-    df_clean.loc[df_clean['hr_artifact'], 'heart_rate'] = np.nan
-    df_clean.loc[df_clean['spo2_artifact'], 'spo2'] = np.nan
+    hr_artifact = moving & (np.abs(np.diff(hr, prepend=np.nan)) > 5.0)
     
-    # Linear interpolation for all NaNs (including sensor dropouts)
-    df_clean['heart_rate'] = df_clean['heart_rate'].interpolate(method='linear', limit=30)
-    df_clean['spo2'] = df_clean['spo2'].interpolate(method='linear', limit=30)
+    # 3. Suppress artifacts: branchless blend of NaN into flagged samples
+    hr_out = np.where(hr_artifact, np.nan, hr)
+    spo2_out = np.where(spo2_artifact, np.nan, spo2)
     
     # 4. Artifact Confidence Score per window (rolling 60s window)
     # Higher vibration = Lower confidence
-    df_clean['artifact_confidence'] = 1.0 - (df_clean['vibration'].rolling(60, center=True).mean().clip(0, 1))
+    confidence = 1.0 - np.clip(_rolling_mean_centered(vibration, 60), 0, 1)
+    
+    return is_motion, motion_risk, hr_artifact, spo2_artifact, hr_out, spo2_out, confidence
+
+if HAS_NUMBA:
+    @njit(cache=True)
+    def _clean(vibration, spo2, hr, motion_threshold):
+        """
+        Single-pass equivalent of _clean_numpy. Centered windows are emitted with a lag:
+        the 5-sample motion window for sample i - 2 and the 60-sample confidence window
+        (i - 59 .. i, centered like pandas) for sample i - 29 once sample i has been read.
+        """
+        n = len(vibration)
+        is_motion = np.empty(n, dtype=np.bool_)
+        motion_risk = np.zeros(n)
+        hr_artifact = np.zeros(n, dtype=np.bool_)
+        spo2_artifact = np.zeros(n, dtype=np.bool_)
+        hr_out = hr.copy()
+        spo2_out = spo2.copy()
+        confidence = np.full(n, np.nan)
+        
+        motion_count = 0
+        vib_sum = 0.0
+        vib_nan = 0
+        for i in range(n + 2):
+            if i < n:
+                is_motion[i] = vibration[i] > motion_threshold
+                motion_count += is_motion[i]
+                if i >= 5:
+                    motion_count -= is_motion[i - 5]
+                
+                # Running sum over the trailing 60 samples; any NaN invalidates the window
+                if np.isnan(vibration[i]):
+                    vib_nan += 1
+                else:
+                    vib_sum += vibration[i]
+                if i >= 60:
+                    if np.isnan(vibration[i - 60]):
+                        vib_nan -= 1
+                    else:
+                        vib_sum -= vibration[i - 60]
+                if i >= 59 and vib_nan == 0:
+                    confidence[i - 29] = 1.0 - min(max(vib_sum / 60.0, 0.0), 1.0)
+                
+                if i >= 4:
+                    motion_risk[i - 2] = 1.0 if motion_count > 0 else 0.0
+            
+            # Flag sample j now that its motion window is complete
+            j = i - 2
+            if j < 1:
+                continue
+            # NaN diffs compare False, matching pandas diff().abs()
+            spo2_diff = abs(spo2[j] - spo2[j - 1])
+            hr_diff = abs(hr[j] - hr[j - 1])
+            if motion_risk[j] > 0.5 and spo2_diff > 2.0:
+                spo2_artifact[j] = True
+            if motion_risk[j] > 0.8 and spo2[j] < 85:
+                spo2_artifact[j] = True
+            if motion_risk[j] > 0.5 and hr_diff > 5.0:
+                hr_artifact[j] = True
+            
+            if hr_artifact[j]:
+                hr_out[j] = np.nan
+            if spo2_artifact[j]:
+                spo2_out[j] = np.nan
+        
+        return is_motion, motion_risk, hr_artifact, spo2_artifact, hr_out, spo2_out, confidence
+
+def _detect_artifacts(vibration, spo2, hr, motion_threshold):
+    clean = _clean if HAS_NUMBA else _clean_numpy
+    return clean(
+        np.ascontiguousarray(vibration, dtype=SIGNAL_DTYPE),
+        np.ascontiguousarray(spo2, dtype=SIGNAL_DTYPE),
+        np.ascontiguousarray(hr, dtype=SIGNAL_DTYPE),
+        float(motion_threshold),
+    )
+
+def _interpolate(v, limit=30):
+    """
+    Linear interpolation of NaNs (including sensor dropouts), filling at most `limit` samples per gap.
+    Matches pandas interpolate(method='linear', limit=limit): leading NaNs are kept and trailing
+    NaNs take the last valid value.
+    """
+    out = np.array(v)
+    missing = np.isnan(out)
+    if not missing.any() or missing.all():
+        return out
+    
+    idx = np.arange(len(out))
+    valid = ~missing
+    out[missing] = np.interp(idx[missing], idx[valid], out[valid])
+    
+    # Forward limit: only the first `limit` samples after the last valid one are filled
+    last_valid = np.maximum.accumulate(np.where(valid, idx, -1))
+    out[missing & ((last_valid < 0) | (idx - last_valid > limit))] = np.nan
+    return out
+
+def clean_vital_arrays(heart_rate, spo2, vibration, motion_threshold=0.6):
+    """
+    Array-level variant of detect_and_clean_artifacts for callers that do not need the
+    intermediate artifact flags. Returns (heart_rate, spo2, artifact_confidence).
+    """
+    _, _, _, _, hr, spo2, confidence = _detect_artifacts(vibration, spo2, heart_rate, motion_threshold)
+    return _interpolate(hr), _interpolate(spo2), confidence
+
+def detect_and_clean_artifacts(df, motion_threshold=0.6):
+    """
+    Cleans physiological signals by detecting motion-induced artifacts.
+    
+    Logic:
+    1. Identify 'artifact windows' where vibration exceeds threshold.
+    2. Within these windows, if SpO2 drops or HR spikes abruptly, flag them as artifacts.
+    3. Interpolate flagged artifacts and existing NaNs.
+    4. Calculate artifact confidence score (1 - ratio of artifact windows).
+    """
+    df_clean = df.copy()
+    for col in SIGNAL_COLUMNS:
+        if col in df_clean:
+            df_clean[col] = df_clean[col].astype(SIGNAL_DTYPE)
+    
+    is_motion, motion_risk, hr_artifact, spo2_artifact, hr, spo2, confidence = _detect_artifacts(
+        df_clean['vibration'].to_numpy(), df_clean['spo2'].to_numpy(), df_clean['heart_rate'].to_numpy(),
+        motion_threshold,
+    )
+    
+    df_clean['is_motion'] = is_motion
+    df_clean['motion_risk'] = motion_risk
+    df_clean['hr_artifact'] = hr_artifact
+    df_clean['spo2_artifact'] = spo2_artifact
+    df_clean['heart_rate'] = _interpolate(hr)
+    df_clean['spo2'] = _interpolate(spo2)
+    df_clean['artifact_confidence'] = confidence
     
     return df_clean
 
 def plot_cleanup_results(original_df, cleaned_df):
-    plt.figure(figsize=(15, 10))
+    original_df = thin_for_plot(original_df)
+    cleaned_df = thin_for_plot(cleaned_df)
+    
+    fig, axes = plt.subplots(3, 1, figsize=(15, 10))
     
     t = original_df['timestamp']
     
     # HR comparison
-    plt.subplot(3, 1, 1)
-    plt.plot(t, original_df['heart_rate'], 'r', alpha=0.3, label='Original HR')
-    plt.plot(t, cleaned_df['heart_rate'], 'b', label='Cleaned HR')
-    plt.legend()
-    plt.title('Heart Rate Cleaning')
+    axes[0].plot(t, original_df['heart_rate'], 'r', alpha=0.3, label='Original HR')
+    axes[0].plot(t, cleaned_df['heart_rate'], 'b', label='Cleaned HR')
+    axes[0].legend()
+    axes[0].set_title('Heart Rate Cleaning')
     
     # SpO2 comparison
-    plt.subplot(3, 1, 2)
-    plt.plot(t, original_df['spo2'], 'g', alpha=0.3, label='Original SpO2')
-    plt.plot(t, cleaned_df['spo2'], 'b', label='Cleaned SpO2')
-    plt.legend()
-    plt.title('SpO2 Cleaning')
+    axes[1].plot(t, original_df['spo2'], 'g', alpha=0.3, label='Original SpO2')
+    axes[1].plot(t, cleaned_df['spo2'], 'b', label='Cleaned SpO2')
+    axes[1].legend()
+    axes[1].set_title('SpO2 Cleaning')
     
     # Vibration and Confidence
-    plt.subplot(3, 1, 3)
-    plt.plot(t, original_df['vibration'], color='gray', alpha=0.5, label='Vibration')
-    plt.plot(t, cleaned_df['artifact_confidence'], color='orange', label='Artifact Confidence')
-    plt.legend()
-    plt.title('Vibration vs Confidence Score')
-    
-    plt.tight_layout()
-    plt.savefig('cleaning_results.png')
+    axes[2].plot(t, original_df['vibration'], color='gray', alpha=0.5, label='Vibration')
+    axes[2].plot(t, cleaned_df['artifact_confidence'], color='orange', label='Artifact Confidence')
+    axes[2].legend()
+    axes[2].set_title('Vibration vs Confidence Score')
+    
+    fig.tight_layout()
+    fig.savefig('cleaning_results.png')
+    plt.close(fig)
     print("Cleanup visualization saved as cleaning_results.png")
 
 if __name__ == "__main__":
@@ -91,11 +247,14 @@ if __name__ == "__main__":
     if not os.path.exists(input_file):
         print(f"Error: {input_file} not found. Run data_gen.py first.")
     else:
-        df = pd.read_csv(input_file)
+        # Uses the Parquet copy written by data_gen.py unless the CSV is newer
+        df = read_table(input_file)
         cleaned_df = detect_and_clean_artifacts(df)
         
         output_file = "cleaned_vitals.csv"
-        cleaned_df.to_csv(output_file, index=False)
-        print(f"Cleaned data saved to {output_file}")
+        cleaned_df.to_csv(output_file, index=False, float_format='%.3f')
+        cleaned_df.to_parquet("cleaned_vitals.parquet", index=False)
+        print(f"Cleaned data saved to {output_file} (and cleaned_vitals.parquet)")
         
-        plot_cleanup_results(df, cleaned_df)
+        if plots_enabled():
+            plot_cleanup_results(df, cleaned_df)
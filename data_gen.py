@@ -1,21 +1,30 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.use('Agg')
-import os
+import matplotlib.pyplot as plt
+
+from pipeline_io import plots_enabled, thin_for_plot
 
-def generate_ambulance_data(duration_sec=1800, sampling_rate=1):
+def _index_range(t, start, end):
+    """
+    Index bounds [i0, i1) of samples with start <= t <= end on the sorted time axis.
+    """
+    return np.searchsorted(t, start, side='left'), np.searchsorted(t, end, side='right')
+
+def generate_ambulance_data(duration_sec=1800, sampling_rate=1, seed=None):
     """
     Generates synthetic physiological time-series data for a smart ambulance system.
     
     Parameters:
         duration_sec (int): Total duration in seconds.
         sampling_rate (int): Samples per second.
+        seed (int): Optional seed for the random generator.
         
     Returns:
         pd.DataFrame: Generated data.
     """
+    rng = np.random.default_rng(seed)
     t = np.arange(0, duration_sec, 1/sampling_rate)
     n = len(t)
     
@@ -24,46 +33,53 @@ def generate_ambulance_data(duration_sec=1800, sampling_rate=1):
     spo2 = np.full(n, 98.0)
     bp_sys = np.full(n, 120.0)
     bp_dia = np.full(n, 80.0)
-    motion = np.random.normal(0.1, 0.05, n) # Background vibration
+    motion = rng.normal(0.1, 0.05, n) # Background vibration
     distress_ground_truth = np.zeros(n)
     
     # 1. Normal transport noise (small fluctuations)
-    hr += np.random.normal(0, 1, n)
-    spo2 += np.random.normal(0, 0.2, n)
-    bp_sys += np.random.normal(0, 2, n)
-    bp_dia += np.random.normal(0, 1.5, n)
+    hr += rng.normal(0, 1, n)
+    spo2 += rng.normal(0, 0.2, n)
+    bp_sys += rng.normal(0, 2, n)
+    bp_dia += rng.normal(0, 1.5, n)
     
     # 2. Gradual patient deterioration (e.g., from 15 min to 25 min)
     deterioration_start = 900
     deterioration_end = 1500
-    det_mask = (t >= deterioration_start) & (t <= deterioration_end)
+    i0, i1 = _index_range(t, deterioration_start, deterioration_end)
     
     # Linear deterioration trends
-    hr[det_mask] += np.linspace(0, 40, np.sum(det_mask)) # HR increases to 115+
-    spo2[det_mask] -= np.linspace(0, 8, np.sum(det_mask)) # SpO2 drops to ~90%
-    bp_sys[det_mask] += np.linspace(0, 30, np.sum(det_mask)) # BP increases (stress)
-    distress_ground_truth[t >= deterioration_start + 100] = 1 # Label distress after trend is established
+    hr[i0:i1] += np.linspace(0, 40, i1 - i0) # HR increases to 115+
+    spo2[i0:i1] -= np.linspace(0, 8, i1 - i0) # SpO2 drops to ~90%
+    bp_sys[i0:i1] += np.linspace(0, 30, i1 - i0) # BP increases (stress)
+    distress_ground_truth[np.searchsorted(t, deterioration_start + 100):] = 1 # Label distress after trend is established
     
     # 3. Motion-induced artifacts
     # Scenario: Large bump/vibration episodes
     artifact_windows = [(300, 330), (700, 720), (1200, 1230)]
-    for start, end in artifact_windows:
-        mask = (t >= start) & (t <= end)
-        motion[mask] += np.random.uniform(0.5, 1.2, np.sum(mask)) # High vibration
+    bounds = [_index_range(t, start, end) for start, end in artifact_windows]
+    
+    # Draw the noise for all windows at once, then hand out consecutive slices
+    offsets = np.cumsum([0] + [i1 - i0 for i0, i1 in bounds])
+    vibration_noise = rng.uniform(0.5, 1.2, offsets[-1]) # High vibration
+    spo2_noise = rng.uniform(5, 15, offsets[-1])
+    hr_noise = rng.uniform(10, 20, offsets[-1])
+    
+    for (i0, i1), o0, o1 in zip(bounds, offsets[:-1], offsets[1:]):
+        motion[i0:i1] += vibration_noise[o0:o1]
         
         # Coupled artifacts
         # SpO2 drops during high motion (sensor decoupling)
-        spo2[mask] -= np.random.uniform(5, 15, np.sum(mask))
+        spo2[i0:i1] -= spo2_noise[o0:o1]
         
         # HR spikes during bumps
-        hr[mask] += np.random.uniform(10, 20, np.sum(mask))
+        hr[i0:i1] += hr_noise[o0:o1]
         
     # 4. Sensor dropout (missing HR and SpO2 for short intervals)
     dropout_windows = [(1000, 1010), (1600, 1605)]
     for start, end in dropout_windows:
-        mask = (t >= start) & (t <= end)
-        hr[mask] = np.nan
-        spo2[mask] = np.nan
+        i0, i1 = _index_range(t, start, end)
+        hr[i0:i1] = np.nan
+        spo2[i0:i1] = np.nan
         
     # Clip values to physiological limits
     hr = np.clip(hr, 40, 200)
@@ -71,13 +87,14 @@ def generate_ambulance_data(duration_sec=1800, sampling_rate=1):
     bp_sys = np.clip(bp_sys, 60, 220)
     bp_dia = np.clip(bp_dia, 40, 130)
     
+    # Signals as float32 (ample resolution for vitals), timestamps stay float64
     df = pd.DataFrame({
         'timestamp': t,
-        'heart_rate': hr,
-        'spo2': spo2,
-        'bp_systolic': bp_sys,
-        'bp_diastolic': bp_dia,
-        'vibration': motion,
+        'heart_rate': hr.astype(np.float32),
+        'spo2': spo2.astype(np.float32),
+        'bp_systolic': bp_sys.astype(np.float32),
+        'bp_diastolic': bp_dia.astype(np.float32),
+        'vibration': motion.astype(np.float32),
         'distress_label': distress_ground_truth
     })
     
@@ -88,7 +105,9 @@ if __name__ == "__main__":
     df = generate_ambulance_data()
     
     output_path = "ambulance_vitals.csv"
-    df.to_csv(output_path, index=False)
+    df.to_csv(output_path, index=False, float_format='%.3f')
+    # Columnar copy for the downstream scripts (no CSV parsing, exact float32 values)
+    df.to_parquet("ambulance_vitals.parquet", index=False)
     print(f"Data saved to {output_path}")
     
     # Basic statistics
@@ -96,31 +115,31 @@ if __name__ == "__main__":
     print(df.describe())
     
     # Basic Plotting for verification
-    plt.figure(figsize=(12, 10))
-    
-    plt.subplot(4, 1, 1)
-    plt.plot(df['timestamp'], df['heart_rate'], label='Heart Rate (bpm)')
-    plt.plot(df['timestamp'], df['distress_label']*100, 'r--', alpha=0.3, label='Ground Truth Distress')
-    plt.legend()
-    plt.ylabel('HR / Distress')
-    
-    plt.subplot(4, 1, 2)
-    plt.plot(df['timestamp'], df['spo2'], label='SpO2 (%)', color='green')
-    plt.legend()
-    plt.ylabel('SpO2')
-    
-    plt.subplot(4, 1, 3)
-    plt.plot(df['timestamp'], df['bp_systolic'], label='BP Systolic', color='purple')
-    plt.plot(df['timestamp'], df['bp_diastolic'], label='BP Diastolic', color='orange')
-    plt.legend()
-    plt.ylabel('BP')
-    
-    plt.subplot(4, 1, 4)
-    plt.plot(df['timestamp'], df['vibration'], label='Vibration (Motion)', color='gray')
-    plt.legend()
-    plt.ylabel('Motion')
-    plt.xlabel('Time (s)')
-    
-    plt.tight_layout()
-    plt.savefig('vitals_simulation.png')
-    print("Verification plot saved as vitals_simulation.png")
+    if plots_enabled():
+        plot_df = thin_for_plot(df)
+        t = plot_df['timestamp']
+        fig, axes = plt.subplots(4, 1, figsize=(12, 10))
+        
+        axes[0].plot(t, plot_df['heart_rate'], label='Heart Rate (bpm)')
+        axes[0].plot(t, plot_df['distress_label']*100, 'r--', alpha=0.3, label='Ground Truth Distress')
+        axes[0].legend()
+        axes[0].set_ylabel('HR / Distress')
+        
+        axes[1].plot(t, plot_df['spo2'], label='SpO2 (%)', color='green')
+        axes[1].legend()
+        axes[1].set_ylabel('SpO2')
+        
+        axes[2].plot(t, plot_df['bp_systolic'], label='BP Systolic', color='purple')
+        axes[2].plot(t, plot_df['bp_diastolic'], label='BP Diastolic', color='orange')
+        axes[2].legend()
+        axes[2].set_ylabel('BP')
+        
+        axes[3].plot(t, plot_df['vibration'], label='Vibration (Motion)', color='gray')
+        axes[3].legend()
+        axes[3].set_ylabel('Motion')
+        axes[3].set_xlabel('Time (s)')
+        
+        fig.tight_layout()
+        fig.savefig('vitals_simulation.png')
+        plt.close(fig)
+        print("Verification plot saved as vitals_simulation.png")
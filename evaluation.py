@@ -1,6 +1,7 @@
-import pandas as pd
 import numpy as np
 
+from pipeline_io import read_table
+
 def evaluate_performance(vitals_df, risk_df):
     """
     Evaluates the alert system against ground truth distress labels.
@@ -9,19 +10,27 @@ def evaluate_performance(vitals_df, risk_df):
     # We take the max distress label in the window preceding the alert timestamp
     risk_eval = risk_df.copy()
     
-    gt_labels = []
-    for ts in risk_eval['timestamp']:
-        # Find distress labels in the 30s window ending at ts
-        window_gt = vitals_df[(vitals_df['timestamp'] <= ts) & (vitals_df['timestamp'] > ts - 30)]['distress_label']
-        gt_labels.append(1 if window_gt.max() > 0.5 else 0)
+    order = np.argsort(vitals_df['timestamp'].to_numpy(), kind='stable')
+    ts_arr = vitals_df['timestamp'].to_numpy(dtype=np.float64)[order]
+    lbl = vitals_df['distress_label'].to_numpy(dtype=np.float64)[order]
+    
+    # Bounds of the 30s window (ts - 30, ts] for every risk timestamp
+    q = risk_eval['timestamp'].to_numpy(dtype=np.float64)
+    lo = np.searchsorted(ts_arr, q - 30, side='right')
+    hi = np.searchsorted(ts_arr, q, side='right')
+    
+    # Per-window max label; the padding keeps every bound a valid reduceat index and
+    # fmax skips NaN labels like pandas .max()
+    padded = np.append(lbl, np.nan)
+    maxes = np.fmax.reduceat(padded, np.stack([lo, hi], axis=1).ravel())[::2] if len(q) else np.empty(0)
+    maxes = np.where(hi > lo, maxes, np.nan)
     
-    risk_eval['ground_truth'] = gt_labels
+    risk_eval['ground_truth'] = (maxes > 0.5).astype(int)
     
     # Metrics
-    tp = len(risk_eval[(risk_eval['alert_triggered'] == True) & (risk_eval['ground_truth'] == 1)])
-    fp = len(risk_eval[(risk_eval['alert_triggered'] == True) & (risk_eval['ground_truth'] == 0)])
-    fn = len(risk_eval[(risk_eval['alert_triggered'] == False) & (risk_eval['ground_truth'] == 1)])
-    tn = len(risk_eval[(risk_eval['alert_triggered'] == False) & (risk_eval['ground_truth'] == 0)])
+    # Contingency table in one pass: code = 2 * alert + ground_truth
+    codes = risk_eval['alert_triggered'].to_numpy().astype(np.uint8) * 2 + risk_eval['ground_truth'].to_numpy().astype(np.uint8)
+    tn, fn, fp, tp = (int(c) for c in np.bincount(codes, minlength=4))
     
     precision = tp / (tp + fp) if (tp + fp) > 0 else 0
     recall = tp / (tp + fn) if (tp + fn) > 0 else 0
@@ -66,8 +75,8 @@ def evaluate_performance(vitals_df, risk_df):
 
 if __name__ == "__main__":
     try:
-        vitals_df = pd.read_csv("ambulance_vitals.csv")
-        risk_df = pd.read_csv("risk_results.csv")
+        vitals_df = read_table("ambulance_vitals.csv")
+        risk_df = read_table("risk_results.csv")
         evaluate_performance(vitals_df, risk_df)
     except FileNotFoundError:
         print("Error: Files missing. Ensure data_gen, anomaly_model, and risk_logic have run.")
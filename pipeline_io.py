@@ -0,0 +1,39 @@
+import pandas as pd
+import os
+
+# Rendering cost is roughly linear in points per line; plots are thinned to about this many
+MAX_PLOT_POINTS = 4000
+
+def preferred_path(csv_path):
+    """
+    Returns the Parquet copy of a pipeline output (same name, .parquet) when it exists and is
+    at least as new as the CSV, so a leftover Parquet file never shadows a newer CSV.
+    Otherwise returns csv_path.
+    """
+    parquet_path = os.path.splitext(csv_path)[0] + ".parquet"
+    if not os.path.exists(parquet_path):
+        return csv_path
+    if os.path.exists(csv_path) and os.path.getmtime(parquet_path) < os.path.getmtime(csv_path):
+        return csv_path
+    return parquet_path
+
+def read_table(csv_path):
+    """
+    Reads a pipeline output, using its Parquet copy when preferred_path allows it.
+    """
+    path = preferred_path(csv_path)
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+def plots_enabled():
+    """
+    Figures are skipped when SKIP_PLOTS is set (e.g. for timing runs).
+    """
+    return not os.environ.get('SKIP_PLOTS')
+
+def thin_for_plot(df):
+    """
+    Every n-th row of df, so that at most about MAX_PLOT_POINTS rows are drawn.
+    """
+    return df.iloc[::max(1, len(df) // MAX_PLOT_POINTS)]
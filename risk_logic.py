@@ -1,37 +1,51 @@
 import pandas as pd
 import numpy as np
 
-def calculate_risk_and_alerts(anomaly_df, risk_threshold=0.6, confidence_threshold=0.7):
+# Risk components: (column, base, limit, weight). Each deviation is normalized to 0-1
+# between its base and limit value, then weighted.
+RISK_COMPONENTS = [
+    ('heart_rate_mean', 75, 120, 0.4),   # HR (Base 75, High 120), 40% weight
+    ('spo2_mean', 98, 90, 0.4),          # SpO2 (Base 98, Low 90), 40% weight
+    ('bp_systolic_mean', 120, 160, 0.2), # BP (Base 120, High 160), 20% weight
+]
+SYNERGY_MULTIPLIER = 1.2
+
+def _concat(*parts):
+    """
+    Element-wise string concatenation of string arrays and scalar literals.
+    """
+    out = parts[0]
+    for part in parts[1:]:
+        out = np.char.add(out, part)
+    return out
+
+def calculate_risk_and_alerts(anomaly_df, risk_threshold=0.6, confidence_threshold=0.7, persistence_windows=2):
     """
     Computes real-time risk scores and triggers alerts based on safety-critical logic.
+    An alert requires the risk threshold to be breached in `persistence_windows` consecutive windows.
     """
+    if persistence_windows < 1:
+        raise ValueError(f"persistence_windows must be at least 1, got {persistence_windows}")
+    
     risk_df = anomaly_df.copy()
     
     # 1. Normalized Risk Score (0-1)
     # Combination of physiological instability (slopes and means)
     # We use a weighted sum of normalized deviations
     
-    # Normalize HR (Base 75, High 120)
-    hr_risk = (risk_df['heart_rate_mean'] - 75) / (120 - 75)
-    hr_risk = hr_risk.clip(0, 1) * 0.4 # 40% weight
-    
-    # Normalize SpO2 (Base 98, Low 90)
-    spo2_risk = (98 - risk_df['spo2_mean']) / (98 - 90)
-    spo2_risk = spo2_risk.clip(0, 1) * 0.4 # 40% weight
-    
-    # Normalize BP (Base 120, High 160)
-    bp_risk = (risk_df['bp_systolic_mean'] - 120) / (160 - 120)
-    bp_risk = bp_risk.clip(0, 1) * 0.2 # 20% weight
-    
-    risk_df['risk_score'] = (hr_risk + spo2_risk + bp_risk).clip(0, 1)
+    risk_score = np.zeros(len(risk_df))
+    for col, base, limit, weight in RISK_COMPONENTS:
+        values = risk_df[col].to_numpy(dtype=np.float64)
+        risk_score += np.clip((values - base) / (limit - base), 0, 1) * weight
+    risk_score = np.clip(risk_score, 0, 1)
     
     # Increase risk if symptoms are worsening (positive slopes for HR/BP, negative for SpO2)
-    slope_multiplier = 1.0
     if 'heart_rate_slope' in risk_df:
         # If HR is rising AND SpO2 is falling, it's a critical synergy
-        critical_synergy = (risk_df['heart_rate_slope'] > 0.02) & (risk_df['spo2_slope'] < -0.005)
-        risk_df.loc[critical_synergy, 'risk_score'] *= 1.2
-        risk_df['risk_score'] = risk_df['risk_score'].clip(0, 1)
+        synergy = (risk_df['heart_rate_slope'].to_numpy() > 0.02) & (risk_df['spo2_slope'].to_numpy() < -0.005)
+        risk_score = np.clip(np.where(synergy, risk_score * SYNERGY_MULTIPLIER, risk_score), 0, 1)
+    
+    risk_df['risk_score'] = risk_score
 
     # 2. Confidence Score (Already mostly calculated as artifact_confidence)
     # We can further penalize if variance is extremely high (unstable sensors)
@@ -42,28 +56,49 @@ def calculate_risk_and_alerts(anomaly_df, risk_threshold=0.6, confidence_thresho
     # Alert triggers ONLY when:
     # - Risk is high
     # - Confidence is acceptable
-    # - Trend persists (implemented here as risk > threshold for 2 consecutive windows)
+    # - Trend persists (implemented here as risk > threshold for persistence_windows consecutive windows)
     
     risk_df['risk_threshold_breached'] = risk_df['risk_score'] > risk_threshold
     risk_df['confidence_acceptable'] = risk_df['final_confidence'] > confidence_threshold
     
-    # Persistence check (current and previous window)
-    risk_df['persistent_risk'] = risk_df['risk_threshold_breached'] & risk_df['risk_threshold_breached'].shift(1).fillna(False)
+    # Persistence check (current window and the persistence_windows - 1 before it)
+    breached = risk_df['risk_threshold_breached'].to_numpy(dtype=bool)
+    k = persistence_windows
+    n = len(breached)
+    persistent = np.zeros(n, dtype=bool)
+    if n >= k:
+        persistent[k - 1:] = np.logical_and.reduce([breached[i:n - (k - 1 - i)] for i in range(k)])
+    risk_df['persistent_risk'] = persistent
     
     # Alert Trigger
     risk_df['alert_triggered'] = risk_df['persistent_risk'] & risk_df['confidence_acceptable']
     
-    # Explainability comments
-    def get_alert_comment(row):
-        if row['alert_triggered']:
-            return f"CRITICAL: High risk ({row['risk_score']:.2f}) with stable sensor ({row['final_confidence']:.2f}). {row['reasons']}"
-        elif row['risk_threshold_breached'] and not row['confidence_acceptable']:
-            return f"SUPPRESSED: High risk ({row['risk_score']:.2f}) but low confidence ({row['final_confidence']:.2f}) due to motion/artifacts."
-        elif row['risk_threshold_breached'] and not row['persistent_risk']:
-            return "WAITING: Risk threshold breached but awaiting trend persistence."
-        return "Normal status."
-
-    risk_df['alert_comment'] = risk_df.apply(get_alert_comment, axis=1)
+    # Explainability comments (strings are only formatted for rows in each branch)
+    cond_alert = risk_df['alert_triggered'].to_numpy(dtype=bool)
+    cond_suppressed = breached & ~risk_df['confidence_acceptable'].to_numpy(dtype=bool)
+    cond_waiting = breached & ~risk_df['persistent_risk'].to_numpy(dtype=bool)
+    
+    risk_score = risk_df['risk_score'].to_numpy(dtype=np.float64)
+    final_confidence = risk_df['final_confidence'].to_numpy(dtype=np.float64)
+    
+    critical = np.empty(len(risk_df), dtype=object)
+    critical[cond_alert] = _concat(
+        "CRITICAL: High risk (", np.char.mod('%.2f', risk_score[cond_alert]),
+        ") with stable sensor (", np.char.mod('%.2f', final_confidence[cond_alert]),
+        "). ", risk_df['reasons'].to_numpy()[cond_alert].astype(str),
+    )
+    suppressed = np.empty(len(risk_df), dtype=object)
+    suppressed[cond_suppressed] = _concat(
+        "SUPPRESSED: High risk (", np.char.mod('%.2f', risk_score[cond_suppressed]),
+        ") but low confidence (", np.char.mod('%.2f', final_confidence[cond_suppressed]),
+        ") due to motion/artifacts.",
+    )
+    
+    risk_df['alert_comment'] = np.select(
+        [cond_alert, cond_suppressed, cond_waiting],
+        [critical, suppressed, "WAITING: Risk threshold breached but awaiting trend persistence."],
+        default="Normal status.",
+    )
     
     return risk_df
 
@@ -72,7 +107,8 @@ if __name__ == "__main__":
         anomaly_df = pd.read_csv("anomaly_results.csv")
         risk_results = calculate_risk_and_alerts(anomaly_df)
         risk_results.to_csv("risk_results.csv", index=False)
-        print("Risk scoring complete. Results saved to risk_results.csv")
+        risk_results.to_parquet("risk_results.parquet", index=False)
+        print("Risk scoring complete. Results saved to risk_results.csv (and risk_results.parquet)")
         
         # Show some active alerts
         alerts = risk_results[risk_results['alert_triggered']]
@@ -1,9 +1,12 @@
-import requests
+import asyncio
+import httpx
 import json
+import orjson
 import random
 import time
 
 url = "http://localhost:8000/predict"
+num_requests = 20
 
 # Generate 30 seconds of dummy data (1Hz)
 data = []
@@ -25,10 +28,23 @@ for i in range(25, 30):
     data[i]["heart_rate"] = 110 + random.uniform(-2, 2) # Rising HR
     data[i]["spo2"] = 92 + random.uniform(-0.5, 0.5)    # Dropping SpO2
 
-print(f"Sending {len(data)} data points to {url}...")
+async def run(n):
+    # Serialize once and pipeline n concurrent requests over a shared client
+    # (HTTP/2 is used when the server negotiates it, otherwise pooled HTTP/1.1)
+    payload = orjson.dumps(data)
+    headers = {'Content-Type': 'application/json'}
+    async with httpx.AsyncClient(http2=True) as client:
+        return await asyncio.gather(*[client.post(url, content=payload, headers=headers) for _ in range(n)])
+
+print(f"Sending {num_requests} requests of {len(data)} data points to {url}...")
 
 try:
-    response = requests.post(url, json=data)
+    t0 = time.perf_counter()
+    responses = asyncio.run(run(num_requests))
+    elapsed = time.perf_counter() - t0
+    print(f"Completed {len(responses)} requests in {elapsed:.2f}s ({len(responses) / elapsed:.1f} req/s)")
+    
+    response = responses[0]
     print(f"Status Code: {response.status_code}")
     print("Response JSON:")
     print(json.dumps(response.json(), indent=2))
@@ -0,0 +1,157 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import anomaly_model
+import artifact_detection
+import pipeline_io
+import risk_logic
+from api.app import app
+from data_gen import generate_ambulance_data
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="module")
+def raw_df():
+    return generate_ambulance_data(seed=0)
+
+
+@pytest.fixture(scope="module")
+def cleaned_df(raw_df):
+    return artifact_detection.detect_and_clean_artifacts(raw_df)
+
+
+def assert_frames_close(a, b):
+    assert list(a.columns) == list(b.columns)
+    assert len(a) == len(b)
+    for col in a.columns:
+        if a[col].dtype.kind == 'f':
+            np.testing.assert_allclose(a[col], b[col], rtol=1e-6, atol=1e-6, err_msg=col)
+        else:
+            assert (a[col].to_numpy() == b[col].to_numpy()).all(), col
+
+
+@pytest.mark.parametrize("window_size,step_size", [(30, 10), (30, 7), (5, 10), (1, 3)])
+def test_detect_anomalies_numba_matches_numpy(cleaned_df, monkeypatch, window_size, step_size):
+    pytest.importorskip("numba")
+    jit = anomaly_model.detect_anomalies(cleaned_df, window_size, step_size)
+    monkeypatch.setattr(anomaly_model, "HAS_NUMBA", False)
+    ref = anomaly_model.detect_anomalies(cleaned_df, window_size, step_size)
+    assert_frames_close(jit, ref)
+
+
+@pytest.mark.parametrize("has_bottleneck", [True, False])
+def test_clean_numba_matches_numpy(raw_df, monkeypatch, has_bottleneck):
+    pytest.importorskip("numba")
+    if has_bottleneck:
+        pytest.importorskip("bottleneck")
+    jit = artifact_detection.detect_and_clean_artifacts(raw_df)
+    monkeypatch.setattr(artifact_detection, "HAS_NUMBA", False)
+    monkeypatch.setattr(artifact_detection, "HAS_BOTTLENECK", has_bottleneck)
+    ref = artifact_detection.detect_and_clean_artifacts(raw_df)
+    assert_frames_close(jit, ref)
+
+
+@pytest.mark.parametrize("n", [3, 4, 5, 59, 60, 61, 200])
+def test_rolling_windows_match_pandas(monkeypatch, n):
+    pytest.importorskip("bottleneck")
+    values = np.random.default_rng(n).uniform(0, 1.2, n)
+    values[::7] = np.nan
+    for window in (5, 60):
+        fast = (artifact_detection._rolling_max_centered(values, window),
+                artifact_detection._rolling_mean_centered(values, window))
+        monkeypatch.setattr(artifact_detection, "HAS_BOTTLENECK", False)
+        ref = (artifact_detection._rolling_max_centered(values, window),
+               artifact_detection._rolling_mean_centered(values, window))
+        monkeypatch.setattr(artifact_detection, "HAS_BOTTLENECK", True)
+        for a, b in zip(fast, ref):
+            np.testing.assert_allclose(a, b, rtol=1e-12)
+
+
+@pytest.mark.parametrize("n", [0, 3, 40, 200])
+def test_clean_kernel_matches_numpy_with_gaps(n):
+    pytest.importorskip("numba")
+    rng = np.random.default_rng(n)
+    vibration = rng.uniform(0, 1.2, n).astype(np.float32)
+    spo2 = rng.uniform(80, 100, n).astype(np.float32)
+    hr = rng.uniform(60, 120, n).astype(np.float32)
+    for signal in (vibration, spo2, hr):
+        signal[rng.random(n) < 0.05] = np.nan
+    for jit, ref in zip(artifact_detection._clean(vibration, spo2, hr, 0.6),
+                        artifact_detection._clean_numpy(vibration, spo2, hr, 0.6)):
+        np.testing.assert_allclose(np.asarray(jit, float), np.asarray(ref, float), atol=1e-6)
+
+
+@pytest.mark.parametrize("window_size,step_size", [(30, 10), (30, 7), (5, 10), (3, 17), (10, 10)])
+@pytest.mark.parametrize("chunksize", [4, 13, 31, 100, 100_000])
+def test_chunked_detection_matches_whole_file(cleaned_df, tmp_path, window_size, step_size, chunksize):
+    path = tmp_path / "cleaned_vitals.csv"
+    cleaned_df.to_csv(path, index=False)
+    whole = anomaly_model.detect_anomalies(pd.read_csv(path), window_size, step_size)
+    chunks = list(anomaly_model.iter_anomalies_chunked(str(path), window_size, step_size, chunksize))
+    assert_frames_close(pd.concat(chunks, ignore_index=True), whole)
+
+
+@pytest.mark.parametrize("persistence_windows", [0, -1])
+def test_persistence_windows_must_be_positive(cleaned_df, persistence_windows):
+    anomalies = anomaly_model.detect_anomalies(cleaned_df)
+    with pytest.raises(ValueError):
+        risk_logic.calculate_risk_and_alerts(anomalies, persistence_windows=persistence_windows)
+
+
+@pytest.mark.parametrize("persistence_windows", [1, 2, 3])
+def test_persistent_risk_requires_consecutive_breaches(cleaned_df, persistence_windows):
+    anomalies = anomaly_model.detect_anomalies(cleaned_df)
+    risk = risk_logic.calculate_risk_and_alerts(anomalies, persistence_windows=persistence_windows)
+    breached = risk['risk_threshold_breached']
+    expected = breached.copy()
+    for lag in range(1, persistence_windows):
+        expected &= breached.shift(lag, fill_value=False)
+    assert (risk['persistent_risk'] == expected).all()
+
+
+def test_preferred_path_ignores_stale_parquet(tmp_path):
+    csv_path = tmp_path / "vitals.csv"
+    parquet_path = tmp_path / "vitals.parquet"
+    assert pipeline_io.preferred_path(str(csv_path)) == str(csv_path)
+    
+    pd.DataFrame({'a': [1.0]}).to_parquet(parquet_path)
+    pd.DataFrame({'a': [2.0]}).to_csv(csv_path, index=False)
+    os.utime(parquet_path, (1_000, 1_000))
+    assert pipeline_io.preferred_path(str(csv_path)) == str(csv_path)
+    assert pipeline_io.read_table(str(csv_path))['a'].tolist() == [2.0]
+    
+    os.utime(csv_path, (500, 500))
+    assert pipeline_io.preferred_path(str(csv_path)) == str(parquet_path)
+    assert pipeline_io.read_table(str(csv_path))['a'].tolist() == [1.0]
+
+
+def test_openapi_documents_vitals_body_and_validation_error():
+    schema = TestClient(app).get("/openapi.json").json()
+    components = schema["components"]["schemas"]
+    assert {"VitalsData", "ValidationError", "HTTPValidationError"} <= components.keys()
+    operation = schema["paths"]["/predict"]["post"]
+    body_schema = operation["requestBody"]["content"]["application/json"]["schema"]
+    assert body_schema["items"] == {"$ref": "#/components/schemas/VitalsData"}
+    error_schema = operation["responses"]["422"]["content"]["application/json"]["schema"]
+    assert error_schema == {"$ref": "#/components/schemas/HTTPValidationError"}
+
+
+@pytest.mark.parametrize("content_type,status", [
+    ("application/json", 200),
+    ("application/json; charset=utf-8", 200),
+    ("application/vnd.vitals+json", 200),
+    ("text/plain", 422),
+    ("application/x-www-form-urlencoded", 422),
+    (None, 422),
+])
+def test_predict_decodes_only_json_bodies(raw_df, content_type, status):
+    window = raw_df.iloc[:30].drop(columns='distress_label').astype(float).to_dict('records')
+    headers = {"content-type": content_type} if content_type else {}
+    response = TestClient(app).post("/predict", content=json.dumps(window), headers=headers)
+    assert response.status_code == status
+    if status == 422:
+        assert response.json()["detail"][0]["loc"] == ["body"]